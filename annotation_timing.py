@@ -0,0 +1,103 @@
+"""Annotation-time analysis: per-annotator and per-tweet throughput, outliers and agreement.
+
+Works on an export of the `results` table (e.g. `\\copy results TO 'results.csv' CSV HEADER`)
+that contains the `submitted_at` and `time_on_tweet` columns recorded by the app.
+
+Run with: python annotation_timing.py results.csv
+"""
+import sys
+import numpy as np
+import pandas as pd
+
+
+# Constants
+
+PERCENTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+OUTLIER_THRESHOLD = 3.5         # Modified z-score above which a dwell time counts as an outlier
+MAD_SCALE = 0.6745              # Makes the median absolute deviation comparable to a standard deviation
+
+
+# Functions
+
+def load_results(path):
+    """Load an exported results table, keeping only rows with timing data.
+
+    Only empty timing fields count as missing: the app stores the emotion label 'None' as text,
+    which pandas would otherwise read as NaN.
+    """
+    results = pd.read_csv(path, parse_dates=['submitted_at'], keep_default_na=False,
+                          na_values={'submitted_at': [''], 'time_on_tweet': ['']})
+    return results.dropna(subset=['time_on_tweet'])
+
+
+def throughput(results, by):
+    """Distribution of time on tweet (seconds) for each value of the `by` column."""
+    grouped = results.groupby(by)['time_on_tweet']
+    stats = grouped.describe(percentiles=PERCENTILES).rename(columns={'count': 'annotations'})
+    stats['tweets_per_hour'] = 3600 / stats['50%'].replace(0, np.nan)      # A zero median (e.g. double-click submits) has no meaningful rate
+    return stats
+
+
+def annotator_throughput(results):
+    return throughput(results, 'author')
+
+
+def tweet_throughput(results):
+    return throughput(results, 'message_id')
+
+
+def flag_outliers(results, threshold=OUTLIER_THRESHOLD):
+    """Add robust z-scores of log dwell time and flag rushed or slow annotations.
+
+    Each dwell time is compared with the median for the same tweet, so hard tweets do not count
+    as slow, and scaled by the median absolute deviation over all annotations, so a few very
+    long pauses do not hide rushed submissions. Tweets annotated only once score 0.
+    """
+    results = results.copy()
+    log_time = np.log1p(results['time_on_tweet'].clip(lower=0))
+    deviation = log_time - log_time.groupby(results['message_id']).transform('median')
+    mad = deviation[deviation != 0].abs().median()
+    results['time_z'] = MAD_SCALE * deviation / mad if mad > 0 else 0.0
+    results['rushed'] = results['time_z'] < -threshold
+    results['slow'] = results['time_z'] > threshold
+    return results
+
+
+def agreement(results):
+    """Agreement on the primary emotion (`emotion_one`).
+
+    Returns (per annotation, per tweet): for each annotation the share of the other annotators
+    of the same tweet that chose the same emotion, and for each tweet the share of annotators
+    that chose its most common emotion.
+    """
+    tweet_size = results.groupby('message_id')['author'].transform('size')
+    same_label = results.groupby(['message_id', 'emotion_one'], dropna=False)['author'].transform('size')
+    others = (tweet_size - 1).replace(0, np.nan)
+    per_annotation = (same_label - 1) / others
+
+    label_counts = results.groupby(['message_id', 'emotion_one'], dropna=False).size()
+    per_tweet = (label_counts.groupby(level='message_id').max()
+                 / label_counts.groupby(level='message_id').sum()).rename('agreement')
+    return per_annotation.rename('agreement'), per_tweet
+
+
+def quality_speed_profile(results, threshold=OUTLIER_THRESHOLD):
+    """Join throughput, outlier rates and agreement scores per annotator and per tweet."""
+    results = flag_outliers(results, threshold)
+    results['agreement'], tweet_agreement = agreement(results)
+
+    rates = results.groupby('author')[['rushed', 'slow', 'agreement']].mean()
+    rates = rates.rename(columns={'rushed': 'rushed_share', 'slow': 'slow_share'})
+    annotators = annotator_throughput(results).join(rates)
+
+    tweets = tweet_throughput(results).join(tweet_agreement)
+    return annotators, tweets
+
+
+if __name__ == '__main__':
+    annotators, tweets = quality_speed_profile(load_results(sys.argv[1]))
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print("Annotators:")
+        print(annotators[['annotations', '50%', 'tweets_per_hour', 'rushed_share', 'slow_share', 'agreement']])
+        print("\nSlowest tweets:")
+        print(tweets.sort_values('50%', ascending=False).head(10)[['annotations', '50%', 'agreement']])
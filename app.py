@@ -1,4 +1,5 @@
 # Imports
+import io
 import os
 import json
 import re
@@ -12,6 +13,8 @@ from datetime import datetime
 import time
 import pytz
 from emotions_map import EMOTION_DICT
+from shared_dataset import SharedDataset
+from image_cache import ThumbnailCache
 
 
 st.markdown("""
@@ -47,9 +50,14 @@ CREATE_TABLE_QUERY = '''CREATE TABLE IF NOT EXISTS public.results
     target_three text COLLATE pg_catalog."default",
     emotion_three text COLLATE pg_catalog."default",
     urgency boolean,
-    irrelevance boolean
+    irrelevance boolean,
+    submitted_at timestamp with time zone,
+    time_on_tweet real
 );'''
 
+MIGRATE_TABLE_QUERY = '''ALTER TABLE public.results ADD COLUMN IF NOT EXISTS submitted_at timestamp with time zone;
+ALTER TABLE public.results ADD COLUMN IF NOT EXISTS time_on_tweet real;'''
+
 EMOTION_OPTIONS = [('Anger', 'Anger'), ('Sadness', 'Sadness'), ('Happiness', 'Happiness'), ('Fear', 'Fear'), ('None', 'None')]
 
 # Functions
@@ -70,18 +78,49 @@ def connect_to_database():
         return None
 
 
-@st.cache_data
+@st.cache_resource
+def load_shared_data(path):
+    """Load a predefined CSV once per process; every session references the same read-only dataset."""
+    return SharedDataset.from_csv(path)
+
+
+@st.cache_resource
+def load_thumbnail_cache():
+    """Load the local thumbnail cache once per process (built offline with image_cache.py)."""
+    return ThumbnailCache()
+
+
+@st.cache_resource
+def load_uploaded_data(content):
+    """Load an uploaded CSV once per distinct file content; sessions uploading the same file share it."""
+    return SharedDataset.from_csv(io.BytesIO(content))
+
+
 def load_data(upload_obj):
     """Load data from uploaded CSV."""
     if upload_obj is None:
         return None
     try:
-        df = pd.read_csv(upload_obj)
+        df = load_uploaded_data(upload_obj.getvalue())
     except (ValueError, RuntimeError, TypeError, NameError):
         logging.debug("Unable to process your request.")
+        return None
     return df
 
 
+@st.cache_resource
+def ensure_schema(_conn):
+    """Add columns missing from older results tables, once per process.
+
+    ALTER TABLE locks the whole table, so this must not run on every submit.
+    """
+    cursor = _conn.cursor()
+    cursor.execute(CREATE_TABLE_QUERY)
+    cursor.execute(MIGRATE_TABLE_QUERY)
+    _conn.commit()
+    return True
+
+
 def save_results(data):
     """Save results to the database."""
 
@@ -89,12 +128,13 @@ def save_results(data):
     if not conn:
         return
 
+    ensure_schema(conn)                             # Create or migrate the table on the first submit of this process
     cursor = conn.cursor()                          # Create cursor to execute queries
     cursor.execute(CREATE_TABLE_QUERY)              # Create a new table if it doesn't exist
 
     for row in data.to_dict(orient='records'):      # Insert the data into the table
-        insert_query = "INSERT INTO results (id, author, data_id, message_id, text, source, target_one, emotion_one, target_two, emotion_two, target_three, emotion_three, urgency, irrelevance) VALUES (DEFAULT, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);"
-        values = (st.session_state.user_id, row['data_id'], row['message_id'], row['text'], row['source'], row['target_one'], row['emotion_one'], row['target_two'], row['emotion_two'], row['target_three'], row['emotion_three'], row['urgency'], row['irrelevance'])
+        insert_query = "INSERT INTO results (id, author, data_id, message_id, text, source, target_one, emotion_one, target_two, emotion_two, target_three, emotion_three, urgency, irrelevance, submitted_at, time_on_tweet) VALUES (DEFAULT, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);"
+        values = (st.session_state.user_id, row['data_id'], row['message_id'], row['text'], row['source'], row['target_one'], row['emotion_one'], row['target_two'], row['emotion_two'], row['target_three'], row['emotion_three'], row['urgency'], row['irrelevance'], row['submitted_at'], row['time_on_tweet'])
         cursor.execute(insert_query, values)
 
     st.session_state["data_id"] += 1                # Increment the question number for the next row
@@ -264,13 +304,19 @@ else:
     
     # Load data into a df for user to annotate
     path = [j["data_path"] for j in config["users"] if j["name"] == st.session_state.user_id][-1]
-    df = pd.read_csv(path) if config["predefined"] else load_data(st.file_uploader("Csv file", type=['.csv']))
+    df = load_shared_data(path) if config["predefined"] else load_data(st.file_uploader("Csv file", type=['.csv']))
 
     if df is not None:                                                                  # If there is data
         st.progress(round((int(st.session_state.data_id) / len(df)) * 100))             # Show progress bar
 
         if st.session_state.data_id < len(df):                                          # If we haven't reached the end of the labeling task yet
-            message_id, text, source, photo_url = df.loc[st.session_state.data_id, ['message_id', 'text', 'source', 'photo_url']]       # Set labeling parameters
+            message_id, text, source, photo_url = df.row(st.session_state.data_id)                    # Set labeling parameters
+
+            if st.session_state.get("shown_data_id") != st.session_state.data_id:          # Start the time-on-tweet clock when a new tweet is first shown
+                st.session_state.update({
+                    "shown_data_id": st.session_state.data_id,
+                    "shown_at": time.monotonic()
+                })
         
             # tab1, tab2, tab3 = st.tabs(["Annotation", "Guide",  "Discussion Board"])
             tab1, tab2, tab3 = st.tabs(["Annotation", "Guide", "Emotions Graph"])
@@ -291,10 +337,9 @@ else:
                 <br><br>
                 """, unsafe_allow_html=True)
                 
-                # Add any images into the sidebar if there are any in the data
-                # for link in str(photo_url).split(','):
-                #     if link != "nan":
-                #         st.sidebar.image(link)
+                # Add any images into the sidebar if there are any in the data (served from the local thumbnail cache)
+                for image in load_thumbnail_cache().get(message_id):
+                    st.sidebar.image(image)
 
                 # Annotations Form
                 with st.form(key="my_form"):                       
@@ -356,6 +401,8 @@ else:
                     st.markdown("  ")
                     
                     if st.form_submit_button("Submit"):
+                        submitted_at = datetime.now(pytz.utc)                                   # Server-side timestamp and time on tweet in seconds
+                        time_on_tweet = round(time.monotonic() - st.session_state.shown_at, 3)
                         if output_one:
                             target_one = json.dumps(output_one)
                         else:
@@ -368,8 +415,8 @@ else:
                             target_three = json.dumps(output_three)
                         else:
                             target_three = ''
-                        data = [[st.session_state.data_id, message_id, text, source, target_one, emotion_one[0], target_two, emotion_two[0], target_three, emotion_three[0], urgency, irrelevance]]
-                        save_results(pd.DataFrame(data, columns=["data_id", "message_id", "text", "source", "target_one", "emotion_one", "target_two", "emotion_two", "target_three", "emotion_three", "urgency", "irrelevance"]))
+                        data = [[st.session_state.data_id, message_id, text, source, target_one, emotion_one[0], target_two, emotion_two[0], target_three, emotion_three[0], urgency, irrelevance, submitted_at, time_on_tweet]]
+                        save_results(pd.DataFrame(data, columns=["data_id", "message_id", "text", "source", "target_one", "emotion_one", "target_two", "emotion_two", "target_three", "emotion_three", "urgency", "irrelevance", "submitted_at", "time_on_tweet"]))
                         
                         reset_form()
                         st.experimental_rerun()
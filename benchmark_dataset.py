@@ -0,0 +1,111 @@
+"""Memory benchmark for the annotation dataset.
+
+1. Footprint of the representation: a full `pd.read_csv` frame vs. the lean SharedDataset.
+2. Resident memory after building each, measured in a fresh process so allocations from
+   one representation do not skew the other. Peak RSS shows the transient cost of parsing;
+   RSS after the build can exceed the data footprint because the allocator keeps part of the
+   memory freed by the parser rather than returning it to the OS.
+3. RSS growth per annotator session. Any process-wide cache (st.cache_resource) makes this
+   flat; without one every session pays for a private frame.
+
+Run with: python benchmark_dataset.py [data_path] [sessions]
+"""
+import gc
+import multiprocessing
+import os
+import resource
+import sys
+import pandas as pd
+from shared_dataset import DATASET_COLUMNS, SharedDataset
+
+
+LOADERS = {
+    'pandas': pd.read_csv,
+    'shared': SharedDataset.from_csv,
+}
+
+
+def rss_mb():
+    """Current resident set size of this process in MB (Linux /proc, falls back to peak RSS)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except OSError:
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def footprint_mb(data):
+    """Bytes held by the data itself, including the Python string objects of a DataFrame.
+
+    memory_usage(deep=True) counts a repeated value (e.g. `source`) once per row even where the
+    csv parser shares one string object, so RSS is the ground truth for the frame.
+    """
+    if isinstance(data, pd.DataFrame):
+        return data.memory_usage(deep=True).sum() / 1024 ** 2
+    return data.nbytes() / 1024 ** 2
+
+
+def warm_up(kind, path):
+    """Build from the first rows only, so lazily imported pandas code is not counted as data."""
+    frame = pd.read_csv(path, nrows=100)
+    if kind == 'shared':
+        SharedDataset(frame[DATASET_COLUMNS])
+    gc.collect()
+
+
+def build_rss(kind, path):
+    """Build one representation and return (RSS growth, peak RSS growth, data footprint) in MB.
+
+    Run in a fresh process.
+    """
+    warm_up(kind, path)
+    start, start_peak = rss_mb(), peak_rss_mb()
+    data = LOADERS[kind](path)
+    gc.collect()
+    return rss_mb() - start, peak_rss_mb() - start_peak, footprint_mb(data)
+
+
+def measure_sessions(scenario, path, sessions):
+    """Return the RSS growth (MB) after each simulated session takes its reference to the data.
+
+    Scenarios: 'pandas per session' reads a private frame per session; 'pandas cached' and
+    'shared cached' mirror st.cache_resource, where the first session builds the data and
+    later ones reuse it. Run in a fresh process.
+    """
+    kind, mode = scenario.split(' ', 1)
+    load = LOADERS[kind]
+    warm_up(kind, path)
+    start = rss_mb()
+    held, growth = [], []
+    for _ in range(sessions):
+        held.append(held[0] if held and mode == 'cached' else load(path))
+        gc.collect()
+        growth.append(rss_mb() - start)
+    return growth
+
+
+def report_sessions(name, growth):
+    per_session = (growth[-1] - growth[0]) / max(len(growth) - 1, 1)
+    print(f"  {name:<16} first session: {growth[0]:7.2f} MB   "
+          f"after {len(growth)} sessions: {growth[-1]:7.2f} MB   per added session: {per_session:6.2f} MB")
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else 'data/tema_wildfires_dataset.csv'
+    sessions = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    print("Representation (data footprint / RSS after build / peak RSS during build):")
+    context = multiprocessing.get_context('spawn')
+    for kind in LOADERS:
+        with context.Pool(1) as pool:
+            rss, peak, footprint = pool.apply(build_rss, (kind, path))
+        print(f"  {kind:<16} {footprint:7.2f} MB / {rss:7.2f} MB / {peak:7.2f} MB")
+
+    print("Sessions (fresh process per line):")
+    for scenario in ['pandas per session', 'pandas cached', 'shared cached']:
+        with context.Pool(1) as pool:
+            report_sessions(scenario, pool.apply(measure_sessions, (scenario, path, sessions)))
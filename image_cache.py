@@ -0,0 +1,233 @@
+"""Offline fetch-and-thumbnail stage for the tweet photos in a dataset's `photo_url` column.
+
+Thumbnails are stored content-addressed (sha256 of the resized JPEG) in THUMBNAIL_DIR, with
+an index.json mapping each photo link to its thumbnail and each message_id to its thumbnails. The app then serves them from a
+local LRU byte cache instead of hot-linking remote images on every rerun.
+
+Run with: python image_cache.py data/tema_wildfires_dataset.csv [--workers 16]
+For testing without network access, --mirror DIR serves DIR on a local file server and
+fetches every photo by its file name from there.
+"""
+import argparse
+import hashlib
+import http.client
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+from urllib.error import URLError
+from urllib.request import urlopen
+from PIL import Image, UnidentifiedImageError
+from shared_dataset import SharedDataset
+
+
+# Constants
+
+THUMBNAIL_DIR = 'data/thumbnails'
+THUMBNAIL_SIZE = (400, 400)
+INDEX_FILE = 'index.json'
+FETCH_TIMEOUT = 10
+SAVE_EVERY = 200                # Write the index after this many links, so an interrupted run keeps its progress
+NETWORK_ERRORS = (URLError, TimeoutError, ConnectionError, http.client.HTTPException)    # Retried on the next run
+NOT_AN_IMAGE_ERRORS = (UnidentifiedImageError, Image.DecompressionBombError, ValueError)  # Never retried
+
+
+# Functions
+
+def split_photo_urls(photo_url):
+    """Split the comma-separated photo_url field into its links."""
+    if not photo_url:
+        return []
+    return [link.strip() for link in str(photo_url).split(',') if link.strip() and link.strip() != 'nan']
+
+
+def make_thumbnail(content, size=THUMBNAIL_SIZE):
+    """Resize image bytes to fit within size and return them as JPEG bytes."""
+    with Image.open(io.BytesIO(content)) as image:
+        image = image.convert('RGB')
+        image.thumbnail(size)
+        output = io.BytesIO()
+        image.save(output, format='JPEG', quality=85)
+    return output.getvalue()
+
+
+def store_thumbnail(thumbnail, thumbnail_dir=THUMBNAIL_DIR):
+    """Write a thumbnail under its content hash and return the hash."""
+    digest = hashlib.sha256(thumbnail).hexdigest()
+    path = thumbnail_path(digest, thumbnail_dir)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')     # Unique per call, as workers may store the same bytes at once
+        with os.fdopen(fd, 'wb') as f:
+            f.write(thumbnail)
+        os.replace(tmp_path, path)
+    return digest
+
+
+def thumbnail_path(digest, thumbnail_dir=THUMBNAIL_DIR):
+    return os.path.join(thumbnail_dir, digest[:2], digest + '.jpg')
+
+
+def load_index(thumbnail_dir=THUMBNAIL_DIR):
+    """Load the index, or an empty one if none exists yet.
+
+    `links` maps each fetched photo link to its thumbnail hash, or to None if the link is not
+    an image; `tweets` maps each message_id to the thumbnail hashes of its photos.
+    """
+    try:
+        with open(os.path.join(thumbnail_dir, INDEX_FILE)) as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        index = {}
+    return {
+        'links': index.get('links', {}),
+        'tweets': {int(message_id): digests for message_id, digests in index.get('tweets', {}).items()},
+    }
+
+
+def save_index(index, thumbnail_dir=THUMBNAIL_DIR):
+    os.makedirs(thumbnail_dir, exist_ok=True)
+    path = os.path.join(thumbnail_dir, INDEX_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({
+            'links': index['links'],
+            'tweets': {str(message_id): digests for message_id, digests in index['tweets'].items()},
+        }, f)
+    os.replace(path + '.tmp', path)
+
+
+def fetch_thumbnail(link, thumbnail_dir=THUMBNAIL_DIR, size=THUMBNAIL_SIZE, rewrite_url=None):
+    """Download, resize and store the image behind one link.
+
+    Returns (link, digest, done): digest is None if the content is not an image, and done is
+    False after a network error, in which case the link is fetched again on the next run.
+    """
+    url = rewrite_url(link) if rewrite_url else link
+    try:
+        with urlopen(url, timeout=FETCH_TIMEOUT) as response:
+            content = response.read()
+        return link, store_thumbnail(make_thumbnail(content, size), thumbnail_dir), True
+    except NOT_AN_IMAGE_ERRORS as e:                # Checked first: UnidentifiedImageError is also an OSError
+        logging.debug(f"{url} is not an image: {e}")
+        return link, None, True
+    except (*NETWORK_ERRORS, OSError) as e:         # Also truncated downloads and disk errors
+        logging.debug(f"Could not fetch {url}: {e}")
+        return link, None, False
+
+
+def build_thumbnails(dataset, thumbnail_dir=THUMBNAIL_DIR, workers=16, size=THUMBNAIL_SIZE, rewrite_url=None):
+    """Fetch and thumbnail the photos of every tweet in the dataset in parallel.
+
+    Each distinct link is fetched once. Links that succeeded or turned out not to be images are
+    skipped on later runs, so the stage can be re-run incrementally and only retries links that
+    failed with network errors. Returns the updated index.
+    """
+    index = load_index(thumbnail_dir)
+    links = index['links']
+    tweet_links = {}
+    for i in range(len(dataset)):
+        photo_links = split_photo_urls(dataset.photo_url(i))
+        if photo_links:
+            tweet_links[int(dataset.message_ids[i])] = photo_links
+    jobs = list(dict.fromkeys(link for photo_links in tweet_links.values() for link in photo_links if link not in links))
+
+    def save():
+        index['tweets'] = {message_id: [links[link] for link in photo_links if links.get(link)]
+                           for message_id, photo_links in tweet_links.items()}
+        save_index(index, thumbnail_dir)
+
+    fetch = partial(fetch_thumbnail, thumbnail_dir=thumbnail_dir, size=size, rewrite_url=rewrite_url)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for done, (link, digest, fetched) in enumerate(executor.map(fetch, jobs), start=1):
+                if fetched:
+                    links[link] = digest
+                if done % SAVE_EVERY == 0:
+                    save()
+    finally:
+        save()
+    return index
+
+
+def serve_directory(directory, port=0):
+    """Serve a local directory over HTTP in a background thread, as a stand-in for the remote image host."""
+    server = ThreadingHTTPServer(('127.0.0.1', port), partial(QuietRequestHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def mirror_url(server):
+    """Rewrite a remote photo url to the file of the same name on a local server."""
+    host, port = server.server_address[:2]
+    return lambda link: f"http://{host}:{port}/{os.path.basename(urlsplit(link).path)}"
+
+
+# Classes
+
+class QuietRequestHandler(SimpleHTTPRequestHandler):
+    """File request handler that does not log every request to stderr."""
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThumbnailCache:
+    """Thread-safe LRU cache of thumbnail bytes, bounded by total size in bytes."""
+
+    def __init__(self, thumbnail_dir=THUMBNAIL_DIR, max_bytes=64 * 1024 ** 2):
+        self.thumbnail_dir = thumbnail_dir
+        self.max_bytes = max_bytes
+        self.index = load_index(thumbnail_dir)['tweets']
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _read(self, digest):
+        with self._lock:
+            if digest in self._entries:
+                self._entries.move_to_end(digest)
+                return self._entries[digest]
+        with open(thumbnail_path(digest, self.thumbnail_dir), 'rb') as f:
+            content = f.read()
+        with self._lock:
+            if digest not in self._entries:
+                self._entries[digest] = content
+                self._size += len(content)
+                while self._size > self.max_bytes and len(self._entries) > 1:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._size -= len(evicted)
+        return content
+
+    def get(self, message_id):
+        """Return the thumbnail bytes of a tweet, or an empty list if it has none."""
+        images = []
+        for digest in self.index.get(int(message_id), []):
+            try:
+                images.append(self._read(digest))
+            except FileNotFoundError:
+                logging.debug(f"Thumbnail {digest} for tweet {message_id} is missing.")
+        return images
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fetch and thumbnail the photos of a dataset.")
+    parser.add_argument('data_path')
+    parser.add_argument('--thumbnail-dir', default=THUMBNAIL_DIR)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--mirror', help="Serve this directory locally and fetch photos from it instead of the web")
+    args = parser.parse_args()
+
+    server = serve_directory(args.mirror) if args.mirror else None
+    index = build_thumbnails(SharedDataset.from_csv(args.data_path), args.thumbnail_dir, args.workers,
+                             rewrite_url=mirror_url(server) if server else None)
+    if server:
+        server.shutdown()
+    tweets = index['tweets']
+    print(f"{sum(1 for digests in tweets.values() if digests)} of {len(tweets)} tweets with photos have thumbnails.")
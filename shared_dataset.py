@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+
+# Constants
+
+DATASET_COLUMNS = ['message_id', 'text', 'source', 'photo_url']     # Only the columns the app actually reads
+
+
+# Functions
+
+def pack_strings(values):
+    """Pack a sequence of strings into one contiguous utf-8 buffer plus an offsets array.
+
+    The column is encoded in one piece rather than row by row, so no per-row bytes objects
+    are left behind to fragment the heap of the long-running app process.
+    """
+    strings = ['' if pd.isna(value) else str(value) for value in values]
+    offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter((len(value.encode('utf-8')) for value in strings), dtype=np.int64, count=len(strings)),
+              out=offsets[1:])
+    buffer = np.frombuffer(''.join(strings).encode('utf-8'), dtype=np.uint8)
+    return buffer, offsets
+
+
+def read_only(array):
+    """Flag an array as read-only so shared references cannot be mutated by a session."""
+    array.setflags(write=False)
+    return array
+
+
+# Classes
+
+class SharedDataset:
+    """Read-only, memory-lean dataset shared by all sessions of the app.
+
+    Texts and photo urls live in a single contiguous byte buffer each, indexed by an
+    offsets array; the source column is stored as categorical codes. Rows are decoded
+    on access, so sessions only ever hold a reference to the same object.
+    """
+
+    def __init__(self, frame):
+        frame = frame.reset_index(drop=True)
+        source = pd.Categorical(frame['source'])
+
+        self.message_ids = read_only(frame['message_id'].to_numpy(dtype=np.int64))
+        self.source_codes = read_only(source.codes.astype(np.int16))
+        self.source_categories = tuple(str(category) for category in source.categories)
+        self.text_buffer, self.text_offsets = map(read_only, pack_strings(frame['text']))
+        self.photo_buffer, self.photo_offsets = map(read_only, pack_strings(frame['photo_url']))
+
+    @classmethod
+    def from_csv(cls, path_or_buffer):
+        """Read a csv and keep only the columns needed for annotation."""
+        return cls(pd.read_csv(path_or_buffer, usecols=DATASET_COLUMNS))
+
+    def __len__(self):
+        return len(self.message_ids)
+
+    def _decode(self, buffer, offsets, index):
+        return buffer[offsets[index]:offsets[index + 1]].tobytes().decode('utf-8')
+
+    def text(self, index):
+        return self._decode(self.text_buffer, self.text_offsets, index)
+
+    def photo_url(self, index):
+        """Return the photo url(s) of a row, or None if the tweet has no images."""
+        return self._decode(self.photo_buffer, self.photo_offsets, index) or None
+
+    def source(self, index):
+        code = self.source_codes[index]
+        return self.source_categories[code] if code >= 0 else None
+
+    def row(self, index):
+        """Return (message_id, text, source, photo_url) for the row at position index."""
+        if not 0 <= index < len(self):
+            raise IndexError(f"Row {index} is out of range for a dataset of {len(self)} rows")
+        return int(self.message_ids[index]), self.text(index), self.source(index), self.photo_url(index)
+
+    def nbytes(self):
+        """Total size of the arrays backing the dataset."""
+        arrays = (self.message_ids, self.source_codes, self.text_buffer, self.text_offsets,
+                  self.photo_buffer, self.photo_offsets)
+        return sum(array.nbytes for array in arrays)
@@ -0,0 +1,85 @@
+"""Run the thumbnail pipeline against the local file server with generated images.
+
+Run with: python -m pytest test_image_cache.py
+"""
+import hashlib
+import io
+import os
+import pandas as pd
+from PIL import Image
+from image_cache import ThumbnailCache, build_thumbnails, load_index, mirror_url, serve_directory, thumbnail_path
+from shared_dataset import SharedDataset
+
+
+def write_image(path, color, size=(800, 600)):
+    Image.new('RGB', size, color).save(path, format='PNG')
+
+
+def dataset(rows):
+    frame = pd.DataFrame(rows, columns=['message_id', 'photo_url'])
+    frame['text'] = 'tweet'
+    frame['source'] = 'Test'
+    return SharedDataset(frame)
+
+
+def test_build_thumbnails(tmp_path):
+    served, thumbnails = tmp_path / 'served', str(tmp_path / 'thumbnails')
+    served.mkdir()
+    write_image(served / 'red.png', 'red')
+    write_image(served / 'red_copy.png', 'red')
+    write_image(served / 'blue.png', 'blue')
+    (served / 'page').write_text('<html>not an image</html>')
+
+    data = dataset([
+        (1, 'http://pbs.twimg.com/media/red.png,http://pbs.twimg.com/media/blue.png'),
+        (2, 'http://pbs.twimg.com/media/red_copy.png'),
+        (3, 'https://t.co/page'),
+        (4, 'http://pbs.twimg.com/media/green.png,http://pbs.twimg.com/media/blue.png'),
+        (5, None),
+    ])
+
+    requested = []
+    server = serve_directory(str(served))
+    try:
+        rewrite = mirror_url(server)
+        def record(link):
+            requested.append(link)
+            return rewrite(link)
+
+        tweets = build_thumbnails(data, thumbnails, workers=4, rewrite_url=record)['tweets']
+
+        # Thumbnails are stored under the sha256 of their bytes, identical images only once
+        red, blue = tweets[1]
+        assert tweets[2] == [red]
+        for digest in (red, blue):
+            with open(thumbnail_path(digest, thumbnails), 'rb') as f:
+                assert hashlib.sha256(f.read()).hexdigest() == digest
+        assert Image.open(thumbnail_path(red, thumbnails)).size == (400, 300)
+        assert sum(len(files) for _, _, files in os.walk(thumbnails) if files) == 3      # red, blue and index.json
+        assert not any(name.endswith('.tmp') for _, _, files in os.walk(thumbnails) for name in files)
+
+        # Not an image is recorded as a permanent failure, a missing image is left to be retried
+        links = load_index(thumbnails)['links']
+        assert links['https://t.co/page'] is None
+        assert 'http://pbs.twimg.com/media/green.png' not in links
+        assert tweets[3] == [] and tweets[4] == [blue]
+        assert 5 not in tweets
+
+        # A re-run only fetches the links that failed with a network error
+        write_image(served / 'green.png', 'green')
+        requested.clear()
+        tweets = build_thumbnails(data, thumbnails, workers=4, rewrite_url=record)['tweets']
+        assert requested == ['http://pbs.twimg.com/media/green.png']
+        assert len(tweets[4]) == 2 and tweets[4][1] == blue
+    finally:
+        server.shutdown()
+
+    # The LRU byte cache serves the stored thumbnails and evicts the least recently used
+    with open(thumbnail_path(red, thumbnails), 'rb') as f:
+        red_bytes = f.read()
+    cache = ThumbnailCache(thumbnails, max_bytes=len(red_bytes))
+    assert cache.get(2) == [red_bytes]
+    assert cache.get(3) == []
+    assert Image.open(io.BytesIO(cache.get(1)[1])).getpixel((0, 0))[2] > 200        # blue
+    assert list(cache._entries) == [blue]
+    assert cache._size == len(cache._entries[blue])